@@ -1,14 +1,25 @@
-from fastapi import FastAPI, APIRouter, Query
+from fastapi import FastAPI, APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+import asyncio
+import bisect
+import hashlib
+from io import BytesIO
 import os
 import logging
+import multiprocessing
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, List, Literal, Optional, Tuple
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 
 ROOT_DIR = Path(__file__).parent
@@ -295,12 +306,18 @@ async def get_site_content():
 
 @api_router.put("/site-content", response_model=SiteContentDoc)
 async def put_site_content(payload: SiteContentUpdate):
-    updated = SiteContentDoc(key="default", content=payload.content, updated_at=now_utc())
+    try:
+        weekly = _weekly_hours(payload.content, strict=True)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    content = await _resolve_media_refs(payload.content)
+    updated = SiteContentDoc(key="default", content=content, updated_at=now_utc())
     doc = _serialize_dt_fields(updated.model_dump(), ["updated_at"])
 
     await db.site_content.update_one(
         {"key": "default"}, {"$set": doc}, upsert=True
     )
+    availability_index.set_hours(weekly)
     return updated
 
 
@@ -340,6 +357,774 @@ async def list_appointment_requests(limit: int = Query(default=20, ge=1, le=100)
     return [AppointmentRequest(**_parse_dt_fields(d, ["created_at"])) for d in docs]
 
 
+# ----------------------------
+# Media (practice photos)
+# ----------------------------
+MEDIA_DIR = Path(os.environ.get("MEDIA_DIR", ROOT_DIR / "media"))
+MEDIA_ORIGINALS_DIR = MEDIA_DIR / "originals"
+MEDIA_VARIANTS_DIR = MEDIA_DIR / "variants"
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+MEDIA_UPLOAD_MAX_BYTES = int(os.environ.get("MEDIA_UPLOAD_MAX_BYTES", 15 * 1024 * 1024))
+MEDIA_WORKERS = int(os.environ.get("MEDIA_WORKERS", 2))
+
+MEDIA_WIDTHS = [320, 640, 960, 1280, 1920]
+MEDIA_FORMATS: Dict[str, Dict[str, Any]] = {
+    "avif": {"mime": "image/avif", "pil": "AVIF", "params": {"quality": 60}},
+    "webp": {"mime": "image/webp", "pil": "WEBP", "params": {"quality": 80}},
+    "jpg": {
+        "mime": "image/jpeg",
+        "pil": "JPEG",
+        "params": {"quality": 82, "optimize": True, "progressive": True},
+    },
+}
+MEDIA_VARIANT_RE = re.compile(r"^(?P<hash>[0-9a-f]{16})-(?P<width>\d+)\.(?P<ext>avif|webp|jpg)$")
+
+
+def _media_formats() -> List[str]:
+    # AVIF encoding depends on how Pillow was built; serve the others regardless.
+    return [f for f in MEDIA_FORMATS if f != "avif" or features.check("avif")]
+
+
+def _variant_filename(digest: str, width: int, ext: str) -> str:
+    return f"{digest}-{width}.{ext}"
+
+
+def _variant_url(filename: str) -> str:
+    return f"/api/media/{filename}"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _render_variants(digest: str, targets: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """Encode the requested (width, ext) variants of a stored original.
+
+    Runs inside the media process pool, so it only touches the filesystem.
+    """
+    MEDIA_VARIANTS_DIR.mkdir(parents=True, exist_ok=True)
+    rendered: List[Dict[str, Any]] = []
+    with Image.open(MEDIA_ORIGINALS_DIR / digest) as src:
+        src = ImageOps.exif_transpose(src)
+        if src.mode not in ("RGB", "RGBA"):
+            has_alpha = src.mode in ("LA", "PA") or "transparency" in src.info
+            src = src.convert("RGBA" if has_alpha else "RGB")
+
+        for width in sorted({w for w, _ in targets}):
+            height = max(1, round(src.height * width / src.width))
+            resized = src if width == src.width else src.resize((width, height), Image.LANCZOS)
+            for w, ext in targets:
+                if w != width:
+                    continue
+                img = resized
+                if ext == "jpg" and img.mode == "RGBA":
+                    flat = Image.new("RGB", img.size, (255, 255, 255))
+                    flat.paste(img, mask=img.split()[3])
+                    img = flat
+                filename = _variant_filename(digest, width, ext)
+                path = MEDIA_VARIANTS_DIR / filename
+                tmp = path.with_name(f".{filename}.{uuid.uuid4().hex}.tmp")
+                fmt = MEDIA_FORMATS[ext]
+                img.save(tmp, fmt["pil"], **fmt["params"])
+                os.replace(tmp, path)
+                rendered.append(
+                    {
+                        "format": ext,
+                        "width": width,
+                        "height": height,
+                        "filename": filename,
+                        "url": _variant_url(filename),
+                        "size": path.stat().st_size,
+                    }
+                )
+    return rendered
+
+
+def _ingest_image(data: bytes, digest: str, formats: List[str]) -> Dict[str, Any]:
+    """Validate an upload, keep the original and render every variant.
+
+    Runs inside the media process pool.
+    """
+    try:
+        with Image.open(BytesIO(data)) as probe:
+            probe.verify()
+        with Image.open(BytesIO(data)) as img:
+            img.load()
+            img = ImageOps.exif_transpose(img)
+            width, height = img.size
+    except OSError as e:
+        # Pillow reports truncated or corrupt data as a bare OSError; keep it
+        # apart from disk errors raised while writing below.
+        raise UnidentifiedImageError(f"Cannot decode image: {e}") from e
+
+    MEDIA_ORIGINALS_DIR.mkdir(parents=True, exist_ok=True)
+    _atomic_write(MEDIA_ORIGINALS_DIR / digest, data)
+
+    # Never upscale: keep the standard widths below the source, plus the
+    # source itself (capped at the largest standard width).
+    widths = {w for w in MEDIA_WIDTHS if w < width}
+    widths.add(min(width, MEDIA_WIDTHS[-1]))
+    targets = [(w, ext) for w in sorted(widths) for ext in formats]
+    return {"width": width, "height": height, "variants": _render_variants(digest, targets)}
+
+
+class MediaVariantCache:
+    """Size-bounded LRU index over the rendered variants on disk.
+
+    Originals are never evicted, so an evicted variant is simply re-rendered
+    the next time it is requested.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+
+    def load(self) -> None:
+        self._entries.clear()
+        self._total = 0
+        if not self.directory.exists():
+            return
+        files = [p for p in self.directory.iterdir() if MEDIA_VARIANT_RE.match(p.name)]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            self.add(path.name, path.stat().st_size)
+
+    def touch(self, filename: str) -> bool:
+        path = self.directory / filename
+        if filename in self._entries:
+            if path.exists():
+                self._entries.move_to_end(filename)
+                return True
+            # Evicted by another worker process or removed by hand.
+            self._total -= self._entries.pop(filename)
+            return False
+        if path.exists():
+            # Rendered by another worker process: start tracking it here.
+            self.add(filename, path.stat().st_size)
+            return True
+        return False
+
+    def add(self, filename: str, size: int) -> None:
+        if filename in self._entries:
+            self._total -= self._entries.pop(filename)
+        self._entries[filename] = size
+        self._total += size
+        self._evict()
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds the budget.
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            filename, size = self._entries.popitem(last=False)
+            self._total -= size
+            (self.directory / filename).unlink(missing_ok=True)
+
+
+media_cache = MediaVariantCache(MEDIA_VARIANTS_DIR, MEDIA_CACHE_MAX_BYTES)
+_media_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_media_pool() -> ProcessPoolExecutor:
+    global _media_pool
+    if _media_pool is None:
+        # Forking after the Mongo client has started its threads can deadlock
+        # the children, so start workers from a clean forkserver instead.
+        _media_pool = ProcessPoolExecutor(
+            max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _media_pool
+
+
+async def _run_in_media_pool(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_media_pool(), fn, *args)
+
+
+class MediaVariant(BaseModel):
+    format: str
+    width: int
+    height: int
+    filename: str
+    url: str
+    size: int
+
+
+class MediaAsset(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    hash: str
+    original_filename: Optional[str] = None
+    width: int
+    height: int
+    variants: List[MediaVariant]
+    created_at: datetime = Field(default_factory=now_utc)
+
+
+def _media_image_fields(asset: MediaAsset) -> Dict[str, Any]:
+    """Fields merged into a site-content image that references `asset`."""
+    by_format: Dict[str, List[MediaVariant]] = {}
+    for v in sorted(asset.variants, key=lambda v: v.width):
+        by_format.setdefault(v.format, []).append(v)
+
+    sources = [
+        {
+            "type": MEDIA_FORMATS[ext]["mime"],
+            "srcSet": ", ".join(f"{v.url} {v.width}w" for v in by_format[ext]),
+        }
+        for ext in MEDIA_FORMATS
+        if ext != "jpg" and ext in by_format
+    ]
+    fallback = by_format.get("jpg") or asset.variants
+    return {
+        "src": fallback[-1].url,
+        "srcSet": ", ".join(f"{v.url} {v.width}w" for v in fallback),
+        "sources": sources,
+        "width": asset.width,
+        "height": asset.height,
+    }
+
+
+def _collect_media_refs(node: Any, refs: List[Dict[str, Any]]) -> None:
+    if isinstance(node, dict):
+        if isinstance(node.get("asset"), str):
+            refs.append(node)
+        for value in node.values():
+            _collect_media_refs(value, refs)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_media_refs(value, refs)
+
+
+async def _resolve_media_refs(content: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill `src`/`srcSet`/`sources` for every `{"asset": <hash>}` image."""
+    refs: List[Dict[str, Any]] = []
+    _collect_media_refs(content, refs)
+    if not refs:
+        return content
+
+    hashes = list({r["asset"] for r in refs})
+    docs = await db.media_assets.find({"hash": {"$in": hashes}}, {"_id": 0}).to_list(len(hashes))
+    assets = {d["hash"]: MediaAsset(**_parse_dt_fields(d, ["created_at"])) for d in docs}
+
+    missing = sorted(set(hashes) - set(assets))
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Unknown media asset(s): {', '.join(missing)}")
+
+    for ref in refs:
+        ref.update(_media_image_fields(assets[ref["asset"]]))
+    return content
+
+
+@api_router.post("/media", response_model=MediaAsset)
+async def upload_media(file: UploadFile = File(...)):
+    data = await file.read(MEDIA_UPLOAD_MAX_BYTES + 1)
+    if len(data) > MEDIA_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty upload")
+
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    existing = await db.media_assets.find_one({"hash": digest}, {"_id": 0})
+    if existing:
+        return MediaAsset(**_parse_dt_fields(existing, ["created_at"]))
+
+    try:
+        result = await _run_in_media_pool(_ingest_image, data, digest, _media_formats())
+    except (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError) as e:
+        logger.warning("Rejected media upload %r: %s", file.filename, e)
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+    asset = MediaAsset(hash=digest, original_filename=file.filename, **result)
+    for v in asset.variants:
+        media_cache.add(v.filename, v.size)
+
+    doc = _serialize_dt_fields(asset.model_dump(), ["created_at"])
+    await db.media_assets.update_one({"hash": digest}, {"$setOnInsert": doc}, upsert=True)
+    return asset
+
+
+@api_router.get("/media", response_model=List[MediaAsset])
+async def list_media(limit: int = Query(default=20, ge=1, le=100)):
+    docs = (
+        await db.media_assets.find({}, {"_id": 0})
+        .sort("created_at", -1)
+        .to_list(limit)
+    )
+    return [MediaAsset(**_parse_dt_fields(d, ["created_at"])) for d in docs]
+
+
+def _open_variant(filename: str) -> Optional[BinaryIO]:
+    try:
+        return open(MEDIA_VARIANTS_DIR / filename, "rb")
+    except FileNotFoundError:
+        return None
+
+
+def _iter_file(f: BinaryIO, chunk_size: int = 64 * 1024):
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+@api_router.get("/media/{filename}")
+async def get_media(filename: str):
+    match = MEDIA_VARIANT_RE.match(filename)
+    if not match:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    # Hold the file open from here on: a concurrent eviction may unlink it
+    # before the response is streamed, and the open handle survives that.
+    f = _open_variant(filename) if media_cache.touch(filename) else None
+    if f is None:
+        # Evicted (or never rendered here): rebuild it from the original.
+        asset = await db.media_assets.find_one(
+            {"hash": match["hash"], "variants.filename": filename}, {"_id": 0}
+        )
+        if not asset or not (MEDIA_ORIGINALS_DIR / match["hash"]).exists():
+            raise HTTPException(status_code=404, detail="Not found")
+        target = (int(match["width"]), match["ext"])
+        rendered = await _run_in_media_pool(_render_variants, match["hash"], [target])
+        f = _open_variant(filename)
+        for v in rendered:
+            media_cache.add(v["filename"], v["size"])
+        if f is None:
+            raise HTTPException(status_code=404, detail="Not found")
+
+    return StreamingResponse(
+        _iter_file(f),
+        media_type=MEDIA_FORMATS[match["ext"]]["mime"],
+        headers={
+            "Content-Length": str(os.fstat(f.fileno()).st_size),
+            # Filenames are content-hashed, so a given URL never changes.
+            "Cache-Control": "public, max-age=31536000, immutable",
+        },
+    )
+
+
+# ----------------------------
+# Appointment availability
+# ----------------------------
+PRACTICE_TZ = ZoneInfo(os.environ.get("PRACTICE_TZ", "Europe/Paris"))
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get("APPOINTMENT_SLOT_MINUTES", 30))
+AVAILABILITY_MAX_DAYS = 92
+# How stale the index may get relative to Mongo, where other worker
+# processes record their bookings and content changes.
+AVAILABILITY_SYNC_SECONDS = float(os.environ.get("AVAILABILITY_SYNC_SECONDS", 5))
+
+WEEKDAYS_FR = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+_WEEKDAY_INDEX = {d.lower(): i for i, d in enumerate(WEEKDAYS_FR)}
+
+# Minutes-of-day windows behind the `preferred_time` choices of the booking dialog.
+PREFERRED_TIME_WINDOWS: Dict[str, Tuple[int, int]] = {
+    "matin": (0, 12 * 60),
+    "midi": (12 * 60, 14 * 60),
+    "après-midi": (14 * 60, 17 * 60),
+    "fin de journée": (17 * 60, 24 * 60),
+}
+
+_HOURS_RANGE_RE = re.compile(r"(\d{1,2})[:hH](\d{2})\s*[-–—]\s*(\d{1,2})[:hH](\d{2})")
+# What may sit between ranges, e.g. "09:00–12:00 / 14:00–18:00" or "… et …".
+_HOURS_SEPARATORS_RE = re.compile(r"(?:[\s/,;]|\bet\b)*", re.IGNORECASE)
+HOURS_CLOSED_MARKERS = {"", "fermé"}
+
+
+def _parse_hours(text: str) -> List[Tuple[int, int]]:
+    """Parse "09:00–13:30 / 14:30–19:00" into minutes-of-day intervals.
+
+    "Fermé" or an empty string means closed. Raises ValueError for text that
+    is not made of time ranges, impossible times, or ranges that do not move
+    forward.
+    """
+    text = (text or "").strip()
+    if text.lower() in HOURS_CLOSED_MARKERS:
+        return []
+    if not _HOURS_SEPARATORS_RE.fullmatch(_HOURS_RANGE_RE.sub(" ", text)):
+        raise ValueError(f"Unreadable opening hours: {text!r}")
+
+    intervals = []
+    for h1, m1, h2, m2 in _HOURS_RANGE_RE.findall(text):
+        start, end = int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+        if int(m1) >= 60 or int(m2) >= 60 or end > 24 * 60 or start >= end:
+            raise ValueError(f"Invalid opening hours: {text!r}")
+        intervals.append((start, end))
+    return sorted(intervals)
+
+
+def _weekly_hours(content: Dict[str, Any], strict: bool = False) -> List[List[Tuple[int, int]]]:
+    """Weekly template (Monday first) from `content.practical.hours`.
+
+    With `strict`, malformed entries raise ValueError; otherwise they are
+    skipped so previously stored content can always be loaded.
+    """
+    weekly: List[List[Tuple[int, int]]] = [[] for _ in range(7)]
+    practical = content.get("practical")
+    hours = practical.get("hours") if isinstance(practical, dict) else None
+    if hours is not None and not isinstance(hours, list):
+        if strict:
+            raise ValueError("`practical.hours` must be a list")
+        hours = None
+
+    for entry in hours or []:
+        if not isinstance(entry, dict):
+            if strict:
+                raise ValueError(f"Invalid opening hours entry: {entry!r}")
+            continue
+        idx = _WEEKDAY_INDEX.get(str(entry.get("day", "")).strip().lower())
+        if idx is None:
+            if strict:
+                raise ValueError(f"Unknown day in opening hours: {entry.get('day')!r}")
+            continue
+        try:
+            weekly[idx] = _parse_hours(str(entry.get("hours", "")))
+        except ValueError:
+            if strict:
+                raise
+            logger.warning("Ignoring invalid opening hours entry %r", entry)
+    return weekly
+
+
+def _local_dt(d: date, minutes: int) -> datetime:
+    # Built from midnight so that a 24:00 boundary lands on the next day.
+    return datetime.combine(d, time(0), tzinfo=PRACTICE_TZ) + timedelta(minutes=minutes)
+
+
+def _local_minutes(dt: datetime) -> Tuple[date, int]:
+    local = _to_practice_tz(dt)
+    return local.date(), local.hour * 60 + local.minute
+
+
+def _to_practice_tz(dt: datetime) -> datetime:
+    # Naive datetimes are taken as wall-clock time at the practice.
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=PRACTICE_TZ)
+    return dt.astimezone(PRACTICE_TZ)
+
+
+class AvailabilitySlot(BaseModel):
+    start: datetime
+    end: datetime
+
+
+class AvailabilityDay(BaseModel):
+    date: date
+    day: str
+    slots: List[AvailabilitySlot]
+
+
+class AvailabilityIndex:
+    """In-memory index of open appointment slots.
+
+    Opening hours are kept as a weekly template of minute intervals, booked
+    or blocked periods as sorted per-date interval lists, and the resulting
+    free slots are memoized per date. Changing the hours drops the memo;
+    adding or removing a block only drops the dates it touches.
+    """
+
+    def __init__(self, slot_minutes: int):
+        self.slot_minutes = slot_minutes
+        self._weekly: List[List[Tuple[int, int]]] = [[] for _ in range(7)]
+        self._blocked: Dict[date, List[Tuple[int, int]]] = {}
+        self._block_spans: Dict[str, List[Tuple[date, int, int]]] = {}
+        self._days: Dict[date, AvailabilityDay] = {}
+        self._today: Optional[date] = None
+
+    def set_hours(self, weekly: List[List[Tuple[int, int]]]) -> None:
+        if weekly != self._weekly:
+            self._weekly = weekly
+            self._days.clear()
+
+    def add_block(self, block_id: str, start: datetime, end: datetime) -> None:
+        self.remove_block(block_id)
+        start, end = _to_practice_tz(start), _to_practice_tz(end)
+        spans = []
+        d = start.date()
+        while d <= end.date():
+            lo = start.hour * 60 + start.minute if d == start.date() else 0
+            hi = end.hour * 60 + end.minute if d == end.date() else 24 * 60
+            if lo < hi:
+                spans.append((d, lo, hi))
+                bisect.insort(self._blocked.setdefault(d, []), (lo, hi))
+                self._days.pop(d, None)
+            d += timedelta(days=1)
+        self._block_spans[block_id] = spans
+
+    def remove_block(self, block_id: str) -> None:
+        for d, lo, hi in self._block_spans.pop(block_id, []):
+            intervals = self._blocked.get(d, [])
+            if (lo, hi) in intervals:
+                intervals.remove((lo, hi))
+            if not intervals:
+                self._blocked.pop(d, None)
+            self._days.pop(d, None)
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies within opening hours and overlaps no block."""
+        d, lo = _local_minutes(start)
+        end_d, hi = _local_minutes(end)
+        if end_d == d + timedelta(days=1) and hi == 0:
+            hi = 24 * 60
+        elif end_d != d:
+            return False
+        if not any(o_start <= lo and hi <= o_end for o_start, o_end in self._weekly[d.weekday()]):
+            return False
+        blocked = self._blocked.get(d, [])
+        i = bisect.bisect_left(blocked, (hi, -1))
+        return not any(b_end > lo for _, b_end in blocked[:i])
+
+    def sync_blocks(self, blocks: List[Tuple[str, datetime, datetime]]) -> None:
+        """Match the indexed blocks to `blocks`, touching only what changed."""
+        current = {block_id for block_id, _, _ in blocks}
+        for block_id in [b for b in self._block_spans if b not in current]:
+            self.remove_block(block_id)
+        for block_id, start, end in blocks:
+            if block_id not in self._block_spans:
+                self.add_block(block_id, start, end)
+
+    def day(self, d: date) -> AvailabilityDay:
+        cached = self._days.get(d)
+        if cached is None:
+            cached = self._days[d] = self._build_day(d)
+        return cached
+
+    def _build_day(self, d: date) -> AvailabilityDay:
+        blocked = self._blocked.get(d, [])
+        slots = []
+        for open_start, open_end in self._weekly[d.weekday()]:
+            start = open_start
+            while start + self.slot_minutes <= open_end:
+                end = start + self.slot_minutes
+                # Blocks are sorted by start; only those starting before `end` can overlap.
+                i = bisect.bisect_left(blocked, (end, -1))
+                if not any(b_end > start for _, b_end in blocked[:i]):
+                    slots.append(AvailabilitySlot(start=_local_dt(d, start), end=_local_dt(d, end)))
+                start = end
+        return AvailabilityDay(date=d, day=WEEKDAYS_FR[d.weekday()], slots=slots)
+
+    def query(self, start: date, end: date, now: Optional[datetime] = None) -> List[AvailabilityDay]:
+        """Open slots from `start` to `end` inclusive, skipping slots already past."""
+        now = now or now_utc()
+        today = now.astimezone(PRACTICE_TZ).date()
+        self._prune(today)
+        days = []
+        d = max(start, today)
+        while d <= end:
+            day = self.day(d)
+            if d == today:
+                day = AvailabilityDay(
+                    date=day.date, day=day.day, slots=[s for s in day.slots if s.start > now]
+                )
+            days.append(day)
+            d += timedelta(days=1)
+        return days
+
+    def _prune(self, today: date) -> None:
+        # Past dates are never queried again; drop them once per day.
+        if today == self._today:
+            return
+        self._today = today
+        for d in [d for d in self._days if d < today]:
+            del self._days[d]
+        for d in [d for d in self._blocked if d < today]:
+            del self._blocked[d]
+        for block_id in [b for b, spans in self._block_spans.items() if not spans or spans[-1][0] < today]:
+            del self._block_spans[block_id]
+
+
+availability_index = AvailabilityIndex(APPOINTMENT_SLOT_MINUTES)
+_availability_synced_at: Optional[float] = None
+
+
+class SlotBlockCreate(BaseModel):
+    start: datetime
+    end: datetime
+    kind: Literal["booking", "blocked"] = "booking"
+    appointment_request_id: Optional[str] = None
+    note: Optional[str] = None
+
+
+class SlotBlock(SlotBlockCreate):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = Field(default_factory=now_utc)
+
+
+class RankedAppointmentRequest(BaseModel):
+    request: AppointmentRequest
+    matching_slots: int
+    first_slot: Optional[AvailabilitySlot] = None
+
+
+def _request_fits(req: AppointmentRequest, slot: AvailabilitySlot) -> bool:
+    local = slot.start.astimezone(PRACTICE_TZ)
+    days = {_WEEKDAY_INDEX.get(d.strip().lower()) for d in req.preferred_days}
+    days.discard(None)
+    if days and local.weekday() not in days:
+        return False
+    window = PREFERRED_TIME_WINDOWS.get((req.preferred_time or "").strip().lower())
+    if window:
+        minutes = local.hour * 60 + local.minute
+        return window[0] <= minutes < window[1]
+    return True
+
+
+def _rank_requests(
+    requests: List[AppointmentRequest], days: List[AvailabilityDay]
+) -> List[RankedAppointmentRequest]:
+    """Order requests by how many open slots match their preferences.
+
+    Ties go to the request whose first matching slot is soonest.
+    """
+    slots = [s for day in days for s in day.slots]
+    ranked = []
+    for req in requests:
+        matching = [s for s in slots if _request_fits(req, s)]
+        ranked.append(
+            RankedAppointmentRequest(
+                request=req,
+                matching_slots=len(matching),
+                first_slot=matching[0] if matching else None,
+            )
+        )
+    far = datetime.max.replace(tzinfo=timezone.utc)
+    ranked.sort(key=lambda r: (-r.matching_slots, r.first_slot.start if r.first_slot else far))
+    return ranked
+
+
+async def _sync_availability_index(force: bool = False) -> None:
+    """Refresh hours and upcoming blocks from Mongo.
+
+    Throttled to AVAILABILITY_SYNC_SECONDS so most queries are answered from
+    memory alone, while changes made by other worker processes still show up.
+    """
+    global _availability_synced_at
+    now = asyncio.get_running_loop().time()
+    if (
+        not force
+        and _availability_synced_at is not None
+        and now - _availability_synced_at < AVAILABILITY_SYNC_SECONDS
+    ):
+        return
+    _availability_synced_at = now
+
+    site = await _get_or_init_site_content()
+    availability_index.set_hours(_weekly_hours(site.content))
+    # Past blocks can no longer affect availability.
+    docs = await db.slot_blocks.find(
+        {"end": {"$gte": now_utc().isoformat()}}, {"_id": 0}
+    ).to_list(None)
+    blocks = [SlotBlock(**_parse_dt_fields(d, ["start", "end", "created_at"])) for d in docs]
+    availability_index.sync_blocks([(b.id, b.start, b.end) for b in blocks])
+
+
+@api_router.get("/availability", response_model=List[AvailabilityDay])
+async def get_availability(
+    from_: Optional[date] = Query(default=None, alias="from"),
+    to: Optional[date] = Query(default=None),
+):
+    today = now_utc().astimezone(PRACTICE_TZ).date()
+    horizon = today + timedelta(days=AVAILABILITY_MAX_DAYS - 1)
+    start = from_ or today
+    for d in (start, to):
+        if d is not None and not today <= d <= horizon:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dates must be between {today.isoformat()} and {horizon.isoformat()}",
+            )
+    end = to or min(start + timedelta(days=13), horizon)
+    if end < start:
+        raise HTTPException(status_code=400, detail="`to` must not be before `from`")
+    await _sync_availability_index()
+    return availability_index.query(start, end)
+
+
+@api_router.post("/slot-blocks", response_model=SlotBlock)
+async def create_slot_block(payload: SlotBlockCreate):
+    block = SlotBlock(**payload.model_dump())
+    block.start = _to_practice_tz(block.start).astimezone(timezone.utc)
+    block.end = _to_practice_tz(block.end).astimezone(timezone.utc)
+    if block.end <= block.start:
+        raise HTTPException(status_code=400, detail="`end` must be after `start`")
+
+    doc = _serialize_dt_fields(block.model_dump(), ["start", "end", "created_at"])
+    overlap = {"start": {"$lt": doc["end"]}, "end": {"$gt": doc["start"]}}
+    if block.kind == "booking":
+        if block.start < now_utc():
+            raise HTTPException(status_code=400, detail="Cannot book a slot in the past")
+        await _sync_availability_index()
+        if not availability_index.is_free(block.start, block.end):
+            raise HTTPException(status_code=409, detail="Slot is not available")
+        # The index may lag behind blocks written by other worker processes.
+        if await db.slot_blocks.find_one(overlap, {"_id": 0}):
+            await _sync_availability_index(force=True)
+            raise HTTPException(status_code=409, detail="Slot is not available")
+
+    # Reserve in the index before awaiting the insert so a concurrent
+    # booking for the same slot sees it.
+    availability_index.add_block(block.id, block.start, block.end)
+    try:
+        await db.slot_blocks.insert_one(doc)
+    except Exception:
+        availability_index.remove_block(block.id)
+        raise
+
+    if block.kind == "booking":
+        # Two workers can both pass the checks above before either inserts;
+        # the booking created first keeps the slot.
+        rivals = await db.slot_blocks.find(
+            {**overlap, "kind": "booking", "id": {"$ne": block.id}}, {"_id": 0}
+        ).to_list(None)
+        if any((r["created_at"], r["id"]) < (doc["created_at"], block.id) for r in rivals):
+            await db.slot_blocks.delete_one({"id": block.id})
+            availability_index.remove_block(block.id)
+            raise HTTPException(status_code=409, detail="Slot is not available")
+
+    # A sync that ran during the insert may have dropped the reservation.
+    availability_index.add_block(block.id, block.start, block.end)
+    return block
+
+
+@api_router.get("/slot-blocks", response_model=List[SlotBlock])
+async def list_slot_blocks(limit: int = Query(default=20, ge=1, le=100)):
+    docs = (
+        await db.slot_blocks.find({"end": {"$gte": now_utc().isoformat()}}, {"_id": 0})
+        .sort("start", 1)
+        .to_list(limit)
+    )
+    return [SlotBlock(**_parse_dt_fields(d, ["start", "end", "created_at"])) for d in docs]
+
+
+@api_router.delete("/slot-blocks/{block_id}")
+async def delete_slot_block(block_id: str):
+    result = await db.slot_blocks.delete_one({"id": block_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Not found")
+    availability_index.remove_block(block_id)
+    return {"deleted": block_id}
+
+
+@api_router.get("/appointment-requests/ranked", response_model=List[RankedAppointmentRequest])
+async def rank_appointment_requests(
+    limit: int = Query(default=20, ge=1, le=100),
+    days: int = Query(default=14, ge=1, le=AVAILABILITY_MAX_DAYS),
+):
+    booked = await db.slot_blocks.distinct(
+        "appointment_request_id", {"kind": "booking", "appointment_request_id": {"$ne": None}}
+    )
+    docs = (
+        await db.appointment_requests.find({"id": {"$nin": booked}}, {"_id": 0})
+        .sort("created_at", -1)
+        .to_list(limit)
+    )
+    reqs = [AppointmentRequest(**_parse_dt_fields(d, ["created_at"])) for d in docs]
+    await _sync_availability_index()
+    start = now_utc().astimezone(PRACTICE_TZ).date()
+    return _rank_requests(reqs, availability_index.query(start, start + timedelta(days=days - 1)))
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -358,6 +1143,22 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@app.on_event("startup")
+async def load_media_cache():
+    media_cache.load()
+
+
+@app.on_event("startup")
+async def load_availability_index():
+    await _sync_availability_index(force=True)
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_media_pool():
+    if _media_pool is not None:
+        _media_pool.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
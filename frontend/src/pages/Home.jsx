@@ -49,17 +49,21 @@ function useSiteContentState({ content, setContent }) {
 
   const save = React.useCallback(async () => {
     try {
-      await api.put("/site-content", { content });
+      const res = await api.put("/site-content", { content });
+      // The server fills in image URLs for uploaded assets.
+      setContent(res.data.content);
       toast.success("Sauvegardé", {
         description: "Contenu enregistré sur le serveur.",
       });
     } catch (e) {
       console.error(e);
+      const detail = e?.response?.data?.detail;
       toast.error("Sauvegarde impossible", {
-        description: "Vérifiez la connexion au serveur.",
+        description:
+          typeof detail === "string" ? detail : "Vérifiez la connexion au serveur.",
       });
     }
-  }, [content]);
+  }, [content, setContent]);
 
   const reset = React.useCallback(async () => {
     try {
@@ -451,12 +455,26 @@ export default function Home({ content, setContent, onAppointment }) {
                     className="overflow-hidden border-slate-200 bg-white/70 backdrop-blur"
                   >
                     <div className="aspect-[4/3] overflow-hidden">
-                      <img
-                        src={img.src}
-                        alt={img.alt}
-                        className="h-full w-full object-cover transition-transform duration-500 hover:scale-[1.03]"
-                        loading="lazy"
-                      />
+                      <picture>
+                        {(img.sources || []).map((source) => (
+                          <source
+                            key={source.type}
+                            type={source.type}
+                            srcSet={source.srcSet}
+                            sizes="(min-width: 640px) 50vw, 100vw"
+                          />
+                        ))}
+                        <img
+                          src={img.src}
+                          srcSet={img.srcSet}
+                          sizes={img.srcSet ? "(min-width: 640px) 50vw, 100vw" : undefined}
+                          width={img.width}
+                          height={img.height}
+                          alt={img.alt}
+                          className="h-full w-full object-cover transition-transform duration-500 hover:scale-[1.03]"
+                          loading="lazy"
+                        />
+                      </picture>
                     </div>
                     <CardContent className="py-3">
                       <div className="text-sm font-medium text-slate-900">
@@ -0,0 +1,104 @@
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d.get(field), reverse=direction < 0)
+        return self
+
+    async def to_list(self, limit):
+        return self.docs[:limit]
+
+
+_OPERATORS = {
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+    "$ne": lambda value, arg: value != arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+}
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for the queries server.py makes."""
+
+    def __init__(self):
+        self.docs = []
+
+    def _values(self, value, path):
+        # Dotted paths descend into sub-documents and fan out over arrays.
+        if not path:
+            return [value]
+        if isinstance(value, list):
+            return [v for item in value for v in self._values(item, path)]
+        if isinstance(value, dict):
+            return self._values(value.get(path[0]), path[1:])
+        return [None]
+
+    def _matches(self, doc, query):
+        for key, cond in query.items():
+            values = self._values(doc, key.split("."))
+            if isinstance(cond, dict):
+                ok = any(all(_OPERATORS[op](v, arg) for op, arg in cond.items()) for v in values)
+            else:
+                ok = cond in values
+            if not ok:
+                return False
+        return True
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if self._matches(d, query)), None)
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([dict(d) for d in self.docs if self._matches(d, query or {})])
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def delete_one(self, query):
+        for i, d in enumerate(self.docs):
+            if self._matches(d, query):
+                del self.docs[i]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def distinct(self, field, query=None):
+        return list({d.get(field) for d in self.docs if self._matches(d, query or {})})
+
+    async def update_one(self, query, update, upsert=False):
+        for d in self.docs:
+            if self._matches(d, query):
+                d.update(update.get("$set", {}))
+                return
+        if upsert:
+            self.docs.append({**query, **update.get("$set", {}), **update.get("$setOnInsert", {})})
+
+
+class FakeDB:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        return self._collections.setdefault(name, FakeCollection())
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(server, "db", db)
+    return db
@@ -0,0 +1,383 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+MONDAY = date(2030, 3, 25)
+
+HOURS = [
+    {"day": "Lundi", "hours": "09:00–13:30 / 14:30–19:00"},
+    {"day": "Mardi", "hours": "08:00–16:30"},
+    {"day": "Jeudi", "hours": "Fermé"},
+]
+
+
+def _index(hours=HOURS):
+    index = server.AvailabilityIndex(30)
+    index.set_hours(server._weekly_hours({"practical": {"hours": hours}}))
+    return index
+
+
+def _local(d, hh, mm=0):
+    return datetime(d.year, d.month, d.day, hh, mm, tzinfo=server.PRACTICE_TZ)
+
+
+def _starts(day):
+    return [s.start.strftime("%H:%M") for s in day.slots]
+
+
+# ----------------------------
+# Hours parsing
+# ----------------------------
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("09:00–13:30 / 14:30–19:00", [(540, 810), (870, 1140)]),
+        ("14:30-19:00 / 08:00-12:00", [(480, 720), (870, 1140)]),
+        ("9h00 — 12h30", [(540, 750)]),
+        ("Fermé", []),
+        (" fermé ", []),
+        ("", []),
+        ("08:00–12:00 et 14:00–18:00", [(480, 720), (840, 1080)]),
+        ("00:00–24:00", [(0, 1440)]),
+    ],
+)
+def test_parse_hours(text, expected):
+    assert server._parse_hours(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "08:00–24:30",
+        "25:00–26:00",
+        "09:75–10:00",
+        "12:00–09:00",
+        "9h-12h",
+        "Sur rendez-vous le matin",
+        "09:00–12:00 / l'après-midi",
+    ],
+)
+def test_parse_hours_rejects_impossible_ranges(text):
+    with pytest.raises(ValueError):
+        server._parse_hours(text)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        {"practical": None},
+        {"practical": {"hours": None}},
+        {"practical": {"hours": ["Lundi 9-12"]}},
+        {"practical": {"hours": "Lundi 9-12"}},
+        {"practical": {"hours": [{"day": "Lundi", "hours": "09:00–25:00"}]}},
+        {"practical": {"hours": [{"day": "Lundi", "hours": "Sur rendez-vous"}]}},
+        {"practical": {"hours": [{"day": "Lundi – Vendredi", "hours": "09:00–12:00"}]}},
+    ],
+)
+def test_weekly_hours_lenient_skips_malformed(content):
+    assert server._weekly_hours(content) == [[] for _ in range(7)]
+
+
+@pytest.mark.parametrize(
+    "hours",
+    [
+        ["Lundi 9-12"],
+        "Lundi 9-12",
+        [{"day": "Lundi", "hours": "09:00–25:00"}],
+        [{"day": "Lundi", "hours": "9h-12h"}],
+        [{"day": "Lundi – Vendredi", "hours": "09:00–12:00"}],
+    ],
+)
+def test_weekly_hours_strict_rejects_malformed(hours):
+    with pytest.raises(ValueError):
+        server._weekly_hours({"practical": {"hours": hours}}, strict=True)
+
+
+# ----------------------------
+# AvailabilityIndex
+# ----------------------------
+def test_day_slots_follow_opening_hours():
+    index = _index()
+
+    monday = index.day(MONDAY)
+    assert len(monday.slots) == 18
+    assert monday.slots[0].start == _local(MONDAY, 9)
+    assert monday.slots[-1].end == _local(MONDAY, 19)
+    assert "13:30" not in _starts(monday)
+    assert index.day(MONDAY + timedelta(days=3)).slots == []
+
+
+def test_full_day_ends_at_midnight():
+    index = _index([{"day": "Lundi", "hours": "00:00–24:00"}])
+
+    slots = index.day(MONDAY).slots
+    assert len(slots) == 48
+    assert slots[-1].end == _local(MONDAY + timedelta(days=1), 0)
+
+
+def test_block_invalidates_only_touched_dates():
+    index = _index()
+    tuesday = MONDAY + timedelta(days=1)
+    index.day(MONDAY)
+    cached_tuesday = index.day(tuesday)
+
+    index.add_block("b1", _local(MONDAY, 10), _local(MONDAY, 11, 15))
+
+    assert MONDAY not in index._days
+    assert index.day(tuesday) is cached_tuesday
+    assert _starts(index.day(MONDAY))[:3] == ["09:00", "09:30", "11:30"]
+
+    index.remove_block("b1")
+
+    assert MONDAY not in index._days
+    assert len(index.day(MONDAY).slots) == 18
+
+
+def test_block_spanning_days_and_ending_at_midnight():
+    index = _index()
+    tuesday = MONDAY + timedelta(days=1)
+
+    index.add_block("b1", _local(MONDAY, 18), _local(tuesday, 9))
+    index.add_block("b2", _local(tuesday, 16), _local(tuesday + timedelta(days=1), 0))
+
+    assert _starts(index.day(MONDAY))[-1] == "17:30"
+    assert _starts(index.day(tuesday))[0] == "09:00"
+    assert _starts(index.day(tuesday))[-1] == "15:30"
+    assert tuesday + timedelta(days=1) not in index._blocked
+
+
+def test_query_skips_past_slots_today_and_prunes_memo():
+    index = _index()
+    index.day(MONDAY - timedelta(days=7))
+    now = _local(MONDAY, 12, 10).astimezone(timezone.utc)
+
+    days = index.query(MONDAY - timedelta(days=1), MONDAY + timedelta(days=1), now=now)
+
+    assert [d.date for d in days] == [MONDAY, MONDAY + timedelta(days=1)]
+    assert _starts(days[0])[0] == "12:30"
+    assert len(index.day(MONDAY).slots) == 18
+    assert min(index._days) == MONDAY
+
+
+def test_prune_drops_ended_block_spans():
+    index = _index()
+    index.add_block("old", _local(MONDAY, 10), _local(MONDAY, 11))
+    index.add_block("spanning", _local(MONDAY, 18), _local(MONDAY + timedelta(days=1), 9))
+    now = _local(MONDAY + timedelta(days=1), 8).astimezone(timezone.utc)
+
+    index.query(MONDAY + timedelta(days=1), MONDAY + timedelta(days=1), now=now)
+
+    assert set(index._block_spans) == {"spanning"}
+
+
+def test_sync_blocks_only_touches_changed_dates():
+    index = _index()
+    tuesday = MONDAY + timedelta(days=1)
+    index.add_block("kept", _local(tuesday, 10), _local(tuesday, 11))
+    index.add_block("gone", _local(MONDAY, 10), _local(MONDAY, 11))
+    cached_tuesday = index.day(tuesday)
+
+    index.sync_blocks(
+        [("kept", _local(tuesday, 10), _local(tuesday, 11)), ("new", _local(MONDAY, 9), _local(MONDAY, 10))]
+    )
+
+    assert index.day(tuesday) is cached_tuesday
+    assert set(index._block_spans) == {"kept", "new"}
+    assert _starts(index.day(MONDAY))[:2] == ["10:00", "10:30"]
+
+
+def test_is_free():
+    index = _index()
+    index.add_block("b1", _local(MONDAY, 10), _local(MONDAY, 11))
+
+    assert index.is_free(_local(MONDAY, 9), _local(MONDAY, 10))
+    assert not index.is_free(_local(MONDAY, 10, 30), _local(MONDAY, 11, 30))
+    assert not index.is_free(_local(MONDAY, 13), _local(MONDAY, 14))
+    assert not index.is_free(_local(MONDAY + timedelta(days=3), 10), _local(MONDAY + timedelta(days=3), 11))
+
+
+# ----------------------------
+# Ranking
+# ----------------------------
+def _request(name, days, time=None):
+    return server.AppointmentRequest(
+        fullname=name, phone="0600000000", reason="Contrôle", consent=True,
+        preferred_days=days, preferred_time=time,
+    )
+
+
+def test_rank_requests():
+    index = _index()
+    days = [index.day(MONDAY + timedelta(days=i)) for i in range(7)]
+
+    ranked = server._rank_requests(
+        [
+            _request("closed", ["Jeudi"]),
+            _request("monday-noon", ["Lundi"], "Midi"),
+            _request("tuesday-noon", ["MARDI"], "midi"),
+            _request("any", []),
+        ],
+        days,
+    )
+
+    assert [(r.request.fullname, r.matching_slots) for r in ranked] == [
+        ("any", 35),
+        ("tuesday-noon", 4),
+        ("monday-noon", 3),
+        ("closed", 0),
+    ]
+    assert ranked[0].first_slot.start == _local(MONDAY, 9)
+    assert ranked[-1].first_slot is None
+
+
+def test_rank_requests_ties_go_to_earliest_slot():
+    index = _index()
+    days = [index.day(MONDAY + timedelta(days=i)) for i in range(7)]
+
+    ranked = server._rank_requests(
+        [_request("tuesday", ["mardi"], "Après-midi"), _request("monday", ["lundi"], "après-midi")],
+        days,
+    )
+
+    assert [(r.request.fullname, r.matching_slots) for r in ranked] == [("monday", 5), ("tuesday", 5)]
+    assert ranked[0].first_slot.start == _local(MONDAY, 14, 30)
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "availability_index", _index())
+    monkeypatch.setattr(server, "_availability_synced_at", None)
+    fake_db.site_content.docs.append({"key": "default", "content": {"practical": {"hours": HOURS}}})
+    return TestClient(server.app)
+
+
+def _next_monday():
+    today = datetime.now(server.PRACTICE_TZ).date()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def test_put_site_content_rejects_bad_hours_without_saving(client, fake_db):
+    res = client.put("/api/site-content", json={"content": {"practical": {"hours": ["Lundi 9-12"]}}})
+
+    assert res.status_code == 422
+    assert fake_db.site_content.docs == [{"key": "default", "content": {"practical": {"hours": HOURS}}}]
+
+
+def test_put_site_content_accepts_null_practical(client, fake_db):
+    res = client.put("/api/site-content", json={"content": {"practical": None}})
+
+    assert res.status_code == 200
+    assert server.availability_index.day(_next_monday()).slots == []
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"from": "9999-12-30", "to": "9999-12-31"},
+        {"from": "9999-12-25"},
+        {"from": "2000-01-01"},
+        {"to": "9999-12-31"},
+    ],
+)
+def test_availability_rejects_dates_outside_window(client, params):
+    assert client.get("/api/availability", params=params).status_code == 400
+
+
+def test_availability_default_range(client):
+    res = client.get("/api/availability")
+
+    assert res.status_code == 200
+    assert len(res.json()) == 14
+
+
+def test_booking_conflicts(client, fake_db):
+    monday = _next_monday()
+    slot = {"start": f"{monday}T10:00:00", "end": f"{monday}T10:30:00"}
+
+    assert client.post("/api/slot-blocks", json=slot).status_code == 200
+    assert client.post("/api/slot-blocks", json=slot).status_code == 409
+    closed = {"start": f"{monday + timedelta(days=3)}T10:00:00", "end": f"{monday + timedelta(days=3)}T10:30:00"}
+    assert client.post("/api/slot-blocks", json=closed).status_code == 409
+    assert client.post("/api/slot-blocks", json={**closed, "kind": "blocked"}).status_code == 200
+    assert len(fake_db.slot_blocks.docs) == 2
+
+
+def test_ranked_excludes_booked_requests(client, fake_db):
+    for name in ("booked", "open"):
+        client.post(
+            "/api/appointment-requests",
+            json={"fullname": name, "phone": "0600000000", "reason": "Contrôle", "consent": True},
+        )
+    booked_id = next(d["id"] for d in fake_db.appointment_requests.docs if d["fullname"] == "booked")
+    monday = _next_monday()
+    client.post(
+        "/api/slot-blocks",
+        json={"start": f"{monday}T10:00:00", "end": f"{monday}T10:30:00", "appointment_request_id": booked_id},
+    )
+
+    res = client.get("/api/appointment-requests/ranked")
+
+    assert [r["request"]["fullname"] for r in res.json()] == ["open"]
+
+
+def _other_worker_booking(fake_db, monday, start="10:00", end="10:30"):
+    block = server.SlotBlock(start=_local(monday, *map(int, start.split(":"))), end=_local(monday, *map(int, end.split(":"))))
+    block.start = block.start.astimezone(timezone.utc)
+    block.end = block.end.astimezone(timezone.utc)
+    fake_db.slot_blocks.docs.append(
+        server._serialize_dt_fields(block.model_dump(), ["start", "end", "created_at"])
+    )
+
+
+def test_booking_in_past_is_rejected(client, fake_db):
+    yesterday = datetime.now(server.PRACTICE_TZ).date() - timedelta(days=1)
+    slot = {"start": f"{yesterday}T10:00:00", "end": f"{yesterday}T10:30:00"}
+
+    assert client.post("/api/slot-blocks", json=slot).status_code == 400
+    assert fake_db.slot_blocks.docs == []
+
+
+def test_booking_conflicts_with_other_worker(client, fake_db, monkeypatch):
+    monday = _next_monday()
+    client.get("/api/availability")  # index synced before the other worker books
+    _other_worker_booking(fake_db, monday)
+
+    res = client.post("/api/slot-blocks", json={"start": f"{monday}T10:15:00", "end": f"{monday}T10:45:00"})
+
+    assert res.status_code == 409
+    assert not server.availability_index.is_free(_local(monday, 10), _local(monday, 10, 30))
+
+
+def test_availability_sees_other_worker_bookings(client, fake_db):
+    monday = _next_monday()
+    _other_worker_booking(fake_db, monday)
+
+    res = client.get("/api/availability", params={"from": str(monday), "to": str(monday)})
+
+    starts = [s["start"][11:16] for s in res.json()[0]["slots"]]
+    assert starts[:2] == ["09:00", "09:30"]
+    assert "10:00" not in starts
+
+
+def test_concurrent_booking_in_other_worker_wins_if_earlier(client, fake_db, monkeypatch):
+    monday = _next_monday()
+    collection = fake_db.slot_blocks
+    insert_one = collection.insert_one
+
+    async def racing_insert(doc):
+        # Another worker's booking lands between our checks and our insert.
+        await insert_one({**doc, "id": "rival", "created_at": "2000-01-01T00:00:00+00:00"})
+        await insert_one(doc)
+
+    monkeypatch.setattr(collection, "insert_one", racing_insert)
+
+    res = client.post("/api/slot-blocks", json={"start": f"{monday}T10:00:00", "end": f"{monday}T10:30:00"})
+
+    assert res.status_code == 409
+    assert [d["id"] for d in collection.docs] == ["rival"]
@@ -0,0 +1,259 @@
+import os
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+
+
+@pytest.fixture
+def media_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "MEDIA_ORIGINALS_DIR", tmp_path / "originals")
+    monkeypatch.setattr(server, "MEDIA_VARIANTS_DIR", tmp_path / "variants")
+    return tmp_path
+
+
+def _png(size, mode="RGB", color=(10, 20, 30)):
+    buf = BytesIO()
+    Image.new(mode, size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _write(directory, name, size):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / name).write_bytes(b"x" * size)
+
+
+# ----------------------------
+# MediaVariantCache
+# ----------------------------
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = server.MediaVariantCache(tmp_path, max_bytes=250)
+    for name in ("a", "b", "c"):
+        _write(tmp_path, f"{name * 16}-320.jpg", 100)
+
+    cache.add("a" * 16 + "-320.jpg", 100)
+    cache.add("b" * 16 + "-320.jpg", 100)
+    assert cache.touch("a" * 16 + "-320.jpg")
+    cache.add("c" * 16 + "-320.jpg", 100)
+
+    assert not (tmp_path / ("b" * 16 + "-320.jpg")).exists()
+    assert (tmp_path / ("a" * 16 + "-320.jpg")).exists()
+    assert list(cache._entries) == ["a" * 16 + "-320.jpg", "c" * 16 + "-320.jpg"]
+    assert cache._total == 200
+
+
+def test_cache_keeps_newest_entry_over_budget(tmp_path):
+    cache = server.MediaVariantCache(tmp_path, max_bytes=50)
+    _write(tmp_path, "a" * 16 + "-320.jpg", 40)
+    _write(tmp_path, "b" * 16 + "-320.jpg", 100)
+
+    cache.add("a" * 16 + "-320.jpg", 40)
+    cache.add("b" * 16 + "-320.jpg", 100)
+
+    assert list(cache._entries) == ["b" * 16 + "-320.jpg"]
+    assert cache._total == 100
+
+
+def test_cache_load_orders_by_mtime_and_skips_foreign_files(tmp_path):
+    _write(tmp_path, "a" * 16 + "-320.jpg", 10)
+    _write(tmp_path, "b" * 16 + "-320.webp", 10)
+    _write(tmp_path, "notes.txt", 10)
+    os.utime(tmp_path / ("a" * 16 + "-320.jpg"), (2000, 2000))
+    os.utime(tmp_path / ("b" * 16 + "-320.webp"), (1000, 1000))
+
+    cache = server.MediaVariantCache(tmp_path, max_bytes=1000)
+    cache.load()
+
+    assert list(cache._entries) == ["b" * 16 + "-320.webp", "a" * 16 + "-320.jpg"]
+    assert cache._total == 20
+
+
+def test_cache_touch_drops_stale_entries(tmp_path):
+    cache = server.MediaVariantCache(tmp_path, max_bytes=1000)
+    name = "a" * 16 + "-320.jpg"
+    _write(tmp_path, name, 10)
+    cache.add(name, 10)
+    (tmp_path / name).unlink()
+
+    assert not cache.touch(name)
+    assert name not in cache._entries
+    assert cache._total == 0
+
+
+# ----------------------------
+# Rendering
+# ----------------------------
+def test_ingest_never_upscales(media_dirs):
+    result = server._ingest_image(_png((1000, 500)), "0123456789abcdef", ["jpg"])
+
+    assert (result["width"], result["height"]) == (1000, 500)
+    assert [v["width"] for v in result["variants"]] == [320, 640, 960, 1000]
+    assert result["variants"][0]["height"] == 160
+    assert (media_dirs / "originals" / "0123456789abcdef").exists()
+
+
+def test_ingest_caps_at_largest_width(media_dirs):
+    result = server._ingest_image(_png((2400, 1200)), "0123456789abcdef", ["jpg"])
+
+    assert [v["width"] for v in result["variants"]] == server.MEDIA_WIDTHS
+
+
+@pytest.mark.parametrize("mode,color", [("RGBA", (0, 0, 0, 0)), ("P", 3), ("LA", (0, 0))])
+def test_ingest_flattens_alpha_and_palette_for_jpeg(media_dirs, mode, color):
+    result = server._ingest_image(_png((200, 100), mode, color), "0123456789abcdef", ["jpg", "webp"])
+
+    jpg = next(v for v in result["variants"] if v["format"] == "jpg")
+    with Image.open(media_dirs / "variants" / jpg["filename"]) as img:
+        assert img.format == "JPEG"
+        assert img.mode == "RGB"
+
+
+def test_media_image_fields():
+    asset = server.MediaAsset(
+        hash="0123456789abcdef",
+        width=800,
+        height=600,
+        variants=[
+            server.MediaVariant(format=ext, width=w, height=w * 3 // 4, filename=f"h-{w}.{ext}", url=f"/m/{w}.{ext}", size=1)
+            for w in (640, 320)
+            for ext in ("jpg", "webp", "avif")
+        ],
+    )
+
+    fields = server._media_image_fields(asset)
+
+    assert fields["src"] == "/m/640.jpg"
+    assert fields["srcSet"] == "/m/320.jpg 320w, /m/640.jpg 640w"
+    assert fields["sources"] == [
+        {"type": "image/avif", "srcSet": "/m/320.avif 320w, /m/640.avif 640w"},
+        {"type": "image/webp", "srcSet": "/m/320.webp 320w, /m/640.webp 640w"},
+    ]
+    assert (fields["width"], fields["height"]) == (800, 600)
+
+
+# ----------------------------
+# Upload endpoint
+# ----------------------------
+@pytest.fixture
+def client(fake_db, media_dirs, monkeypatch):
+    async def run_inline(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(server, "_run_in_media_pool", run_inline)
+    monkeypatch.setattr(server, "media_cache", server.MediaVariantCache(media_dirs / "variants", 10**9))
+    return TestClient(server.app)
+
+
+def test_upload_rejects_non_image(client, fake_db):
+    res = client.post("/api/media", files={"file": ("x.jpg", b"not an image", "image/jpeg")})
+
+    assert res.status_code == 400
+    assert fake_db.media_assets.docs == []
+
+
+def test_upload_rejects_oversized(client, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "MEDIA_UPLOAD_MAX_BYTES", 100)
+
+    res = client.post("/api/media", files={"file": ("x.png", _png((400, 400)), "image/png")})
+
+    assert res.status_code == 413
+    assert fake_db.media_assets.docs == []
+
+
+def test_upload_stores_asset(client, fake_db):
+    res = client.post("/api/media", files={"file": ("x.png", _png((400, 300)), "image/png")})
+
+    assert res.status_code == 200
+    body = res.json()
+    assert body["original_filename"] == "x.png"
+    assert {v["width"] for v in body["variants"]} == {320, 400}
+    assert fake_db.media_assets.docs[0]["hash"] == body["hash"]
+
+
+def test_upload_rejects_truncated_image(client, fake_db):
+    buf = BytesIO()
+    Image.effect_noise((400, 300), 64).convert("RGB").save(buf, "JPEG")
+    data = buf.getvalue()
+
+    res = client.post("/api/media", files={"file": ("x.jpg", data[: len(data) // 2], "image/jpeg")})
+
+    assert res.status_code == 400
+    assert fake_db.media_assets.docs == []
+
+
+# ----------------------------
+# Serving and site-content references
+# ----------------------------
+def _upload(client, size=(400, 300)):
+    res = client.post("/api/media", files={"file": ("x.png", _png(size), "image/png")})
+    assert res.status_code == 200
+    return res.json()
+
+
+def _jpg_variant(asset, width):
+    return next(v for v in asset["variants"] if v["format"] == "jpg" and v["width"] == width)
+
+
+def test_get_media_serves_cached_variant(client, media_dirs):
+    variant = _jpg_variant(_upload(client), 320)
+
+    res = client.get(variant["url"])
+
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "image/jpeg"
+    assert res.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert res.content == (media_dirs / "variants" / variant["filename"]).read_bytes()
+
+
+def test_get_media_rerenders_evicted_variant(client, media_dirs):
+    variant = _jpg_variant(_upload(client), 320)
+    path = media_dirs / "variants" / variant["filename"]
+    path.unlink()
+
+    res = client.get(variant["url"])
+
+    assert res.status_code == 200
+    assert path.exists()
+    assert res.content == path.read_bytes()
+    assert variant["filename"] in server.media_cache._entries
+
+
+@pytest.mark.parametrize("filename", ["0123456789abcdef-320.jpg", "../originals/x", "foo.jpg"])
+def test_get_media_unknown_is_404(client, filename):
+    assert client.get(f"/api/media/{filename}").status_code == 404
+
+
+def test_get_media_unlisted_width_is_404(client):
+    asset = _upload(client)
+
+    assert client.get(f"/api/media/{asset['hash']}-1920.jpg").status_code == 404
+
+
+def test_put_site_content_resolves_asset_refs(client, fake_db):
+    asset = _upload(client)
+    image = {"asset": asset["hash"], "alt": "Salle", "label": "Salle de soins"}
+
+    res = client.put("/api/site-content", json={"content": {"aboutOffice": {"images": [image]}}})
+
+    assert res.status_code == 200
+    saved = res.json()["content"]["aboutOffice"]["images"][0]
+    assert saved["alt"] == "Salle"
+    assert saved["src"] == _jpg_variant(asset, 400)["url"]
+    assert saved["srcSet"].endswith(" 400w")
+    assert "image/webp" in {s["type"] for s in saved["sources"]}
+    assert (saved["width"], saved["height"]) == (400, 300)
+    assert fake_db.site_content.docs[0]["content"]["aboutOffice"]["images"][0]["src"] == saved["src"]
+
+
+def test_put_site_content_rejects_unknown_asset(client, fake_db):
+    res = client.put(
+        "/api/site-content",
+        json={"content": {"aboutOffice": {"images": [{"asset": "ffffffffffffffff"}]}}},
+    )
+
+    assert res.status_code == 422
+    assert "ffffffffffffffff" in res.json()["detail"]
+    assert fake_db.site_content.docs == []